@@ -0,0 +1,145 @@
+"""
+Simulated flash-sale rush: a crowd of logged-in buyers each tries to buy one unit of a product
+with limited stock through the real /add-to-cart and /place-order routes, first with flash sale
+mode off, then with the waiting room and stock gate. The payment SDK is replaced by a stub.
+Run from the project root:
+
+    python -m benchmarks.flash_sale_benchmark --buyers 1000 --stock 100
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from website import create_app, db
+from website.models import Customer, Product, Order
+
+
+class StubAPIService:
+    # Stands in for intasend.APIService so no payment request leaves the machine
+    def __init__(self, *args, **kwargs):
+        self.collect = self
+
+    def mpesa_stk_push(self, **kwargs):
+        return {'id': 'benchmark', 'invoice': {'state': 'PENDING'}}
+
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.pop('_flashes', [])]
+
+
+def buy(app, product_id, buyer_id, latencies):
+    """
+    One buyer: add the product to the cart, retrying while queued, then place the order.
+    Every HTTP request is timed. Returns True when the buyer ends up with an order.
+    """
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(buyer_id)
+        session['_fresh'] = True
+
+    while True:
+        start = time.perf_counter()
+        client.get(f'/add-to-cart/{product_id}', headers={'Referer': '/'})
+        latencies.append(time.perf_counter() - start)
+
+        messages = ' '.join(flashes(client))
+        if 'sold out' in messages:
+            return False
+        if 'in the queue' not in messages:
+            break
+        time.sleep(0.05)
+
+    start = time.perf_counter()
+    client.get('/place-order')
+    latencies.append(time.perf_counter() - start)
+    return 'Order Placed Successfully' in flashes(client)
+
+
+def rush(app, buyers, stock, concurrency):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        product = Product()
+        product.product_name = 'Flash Sale Item'
+        product.current_price = 1
+        product.previous_price = 2
+        product.in_stock = stock
+        product.product_picture = ''
+        product.flash_sale = True
+        db.session.add(product)
+
+        for number in range(buyers):
+            customer = Customer()
+            customer.email = f'buyer{number}@example.com'
+            customer.username = f'buyer{number}'
+            customer.password_hash = ''  # Logged in through the session, hashing would dominate setup
+            db.session.add(customer)
+        db.session.commit()
+        product_id = product.id
+        buyer_ids = [customer.id for customer in Customer.query.all()]
+
+    latencies = []
+    lock = threading.Lock()
+
+    def buyer_task(buyer_id):
+        local = []
+        bought = buy(app, product_id, buyer_id, local)
+        with lock:
+            latencies.extend(local)
+        return bought
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(buyer_task, buyer_ids))
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        sold = sum(order.quantity for order in Order.query.all())
+        remaining = Product.query.get(product_id).in_stock
+
+    return elapsed, sold, remaining, latencies
+
+
+def report(name, elapsed, sold, remaining, latencies):
+    p50 = statistics.median(latencies) * 1000
+    p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+    print(f'{name:>8}: {len(latencies) / elapsed:8.1f} requests/s, p50 {p50:6.1f}ms, p99 {p99:7.1f}ms, '
+          f'{sold} sold, {remaining} left in stock')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buyers', type=int, default=1000)
+    parser.add_argument('--stock', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=64, help='buyers in flight at once')
+    parser.add_argument('--admit-rate', type=int, default=500, help='buyers admitted per second')
+    args = parser.parse_args()
+
+    sys.modules['intasend'] = types.SimpleNamespace(APIService=StubAPIService)
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(directory, "bench.sqlite3")}',
+            'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30, 'check_same_thread': False}},
+            'JINJA_CACHE_DIR': directory,
+        }
+
+        app = create_app(config)
+        report('ungated', *rush(app, args.buyers, args.stock, args.concurrency))
+
+        # A fresh app so the gate loads the restocked product
+        app = create_app(dict(config, FLASH_SALE_MODE=True, FLASH_SALE_ADMIT_RATE=args.admit_rate,
+                              FLASH_SALE_ADMIT_BURST=args.concurrency))
+        report('gated', *rush(app, args.buyers, args.stock, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
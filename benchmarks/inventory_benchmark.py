@@ -0,0 +1,95 @@
+"""
+Benchmark of concurrent stock decrements: the old in-place update of Product.in_stock
+against the inventory ledger. Run from the project root:
+
+    python -m benchmarks.inventory_benchmark --threads 8 --decrements 200
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from website import create_app, db
+from website.models import Product
+from website.inventory import record_movement, SALE
+
+
+def in_place_decrement(product_id):
+    # The read-modify-write that place_order used before the ledger
+    product = Product.query.get(product_id)
+    product.in_stock -= 1
+    db.session.commit()
+
+
+def ledger_decrement(product_id):
+    record_movement(product_id, -1, SALE)
+    db.session.commit()
+
+
+def run(app, decrement, threads, decrements):
+    """
+    Runs `threads` workers that each decrement the same product `decrements` times.
+    Returns (seconds taken, successful decrements, stock actually removed).
+    """
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        product = Product()
+        product.product_name = 'Benchmark Item'
+        product.current_price = 1
+        product.previous_price = 1
+        product.in_stock = threads * decrements
+        product.product_picture = ''
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+    done = []
+
+    def worker():
+        ok = 0
+        with app.app_context():
+            for _ in range(decrements):
+                try:
+                    decrement(product_id)
+                    ok += 1
+                except Exception:
+                    db.session.rollback()
+        done.append(ok)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        remaining = Product.query.get(product_id).in_stock
+
+    return elapsed, sum(done), threads * decrements - remaining
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--decrements', type=int, default=200, help='decrements per thread')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(directory, "bench.sqlite3")}',
+            'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30, 'check_same_thread': False}},
+        })
+
+        for name, decrement in (('in-place', in_place_decrement), ('ledger', ledger_decrement)):
+            elapsed, ok, removed = run(app, decrement, args.threads, args.decrements)
+            print(f'{name:>8}: {ok / elapsed:8.1f} decrements/s, {ok} committed, {removed} removed from stock, '
+                  f'{ok - removed} lost updates')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark of worker cold start: import time, create_app() time and first-request latency,
+each measured in a fresh interpreter. Run from the project root:
+
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Executed in a fresh interpreter for every run so nothing is already imported or compiled
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from website import create_app
+imported = time.perf_counter()
+app = create_app(json.loads(sys.argv[1]))
+created = time.perf_counter()
+client = app.test_client()
+client.get('/')
+first = time.perf_counter()
+client.get('/')
+second = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_request': first - created,
+    'second_request': second - first,
+    'intasend_loaded': 'intasend' in sys.modules,
+}))
+'''
+
+
+def probe(config):
+    output = subprocess.run([sys.executable, '-c', PROBE, json.dumps(config)], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def report(name, results):
+    timings = ', '.join(f'{key} {statistics.median(r[key] for r in results) * 1000:7.1f}ms'
+                        for key in ('import', 'create_app', 'first_request', 'second_request'))
+    print(f'{name:>20}: {timings}, intasend loaded: {results[0]["intasend_loaded"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        config = {'JINJA_CACHE_DIR': cache_dir}
+
+        cold = []
+        for _ in range(args.runs):
+            shutil.rmtree(cache_dir)
+            cold.append(probe(config))
+        report('empty cache', cold)
+
+        report('bytecode cache', [probe(config) for _ in range(args.runs)])
+        report('cache + warm-up', [probe(dict(config, WARM_UP=True)) for _ in range(args.runs)])
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import pytest
+from website import create_app, db
+from website.models import Customer, Product
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp_path, "test.sqlite3")}',
+        'JINJA_CACHE_DIR': str(tmp_path / 'jinja_cache'),
+        'ARCHIVE_DIR': str(tmp_path / 'archive'),
+    })
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def make_customer(email='buyer@example.com'):
+    customer = Customer()
+    customer.email = email
+    customer.username = email.split('@')[0]
+    customer.password = 'password'
+    db.session.add(customer)
+    db.session.commit()
+    return customer
+
+
+def make_product(in_stock=10, flash_sale=False):
+    product = Product()
+    product.product_name = 'Test Item'
+    product.current_price = 100
+    product.previous_price = 120
+    product.in_stock = in_stock
+    product.product_picture = './media/test.jpg'
+    product.flash_sale = flash_sale
+    db.session.add(product)
+    db.session.commit()
+    return product
+
+
+def login(client, customer):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(customer.id)
+        session['_fresh'] = True
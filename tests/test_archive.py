@@ -0,0 +1,132 @@
+import os
+from datetime import datetime, timedelta
+from website import db
+from website.models import Order
+from website.archive import archive_orders, customer_orders, find_archived_order, load_manifest, archive_dir, \
+    order_record, write_records, load_customer_index, archived_count, vacuum_database
+from conftest import make_customer, make_product
+
+
+def make_order(customer, product, status='Delivered', days_ago=200):
+    order = Order()
+    order.quantity = 1
+    order.price = product.current_price
+    order.status = status
+    order.payment_id = 'test'
+    order.customer_link = customer.id
+    order.product_link = product.id
+    order.date_ordered = datetime.utcnow() - timedelta(days=days_ago) if days_ago is not None else None
+    db.session.add(order)
+    db.session.commit()
+    return order.id
+
+
+def test_only_old_terminal_dated_orders_are_archived(app):
+    customer = make_customer()
+    product = make_product()
+    old = make_order(customer, product)
+    recent = make_order(customer, product, days_ago=5)
+    pending = make_order(customer, product, status='Pending')
+    undated = make_order(customer, product, days_ago=None)
+
+    assert archive_orders(days=90) == 1
+
+    assert {order.id for order in Order.query.all()} == {recent, pending, undated}
+    assert find_archived_order(old).id == old
+
+
+def test_batches_write_separate_files_listed_in_manifest(app):
+    customer = make_customer()
+    product = make_product()
+    for _ in range(5):
+        make_order(customer, product)
+
+    assert archive_orders(days=90, batch_size=2) == 5
+
+    entries = [entry for entries in load_manifest()['partitions'].values() for entry in entries]
+    assert [entry['count'] for entry in entries] == [2, 2, 1]
+    assert all(os.path.exists(os.path.join(archive_dir(), entry['file'])) for entry in entries)
+
+
+def test_interrupted_run_files_are_settled(app):
+    customer = make_customer()
+    product = make_product()
+    live_id = make_order(customer, product, days_ago=1)
+    order = Order.query.get(live_id)
+
+    # Written before a delete that never committed: the order is still live
+    write_records('2000-01/orders-live.jsonl.gz', [order_record(order)])
+    # Committed before the manifest was saved: the order is gone from the database
+    gone = order_record(order)
+    gone['id'] = 999
+    write_records('2000-02/orders-gone.jsonl.gz', [gone])
+
+    archive_orders(days=90)
+
+    files = [entry['file'] for entries in load_manifest()['partitions'].values() for entry in entries]
+    assert files == ['2000-02/orders-gone.jsonl.gz']
+    assert not os.path.exists(os.path.join(archive_dir(), '2000-01/orders-live.jsonl.gz'))
+    assert find_archived_order(999).id == 999
+
+
+def test_customer_orders_pages_from_live_into_archive(app):
+    customer = make_customer()
+    other = make_customer('other@example.com')
+    product = make_product()
+    archived_ids = [make_order(customer, product) for _ in range(3)]
+    make_order(other, product)
+    archive_orders(days=90)
+    live_ids = [make_order(customer, product, days_ago=1) for _ in range(2)]
+
+    pages = [customer_orders(customer.id, page, 2) for page in (1, 2, 3)]
+
+    assert [[order.id for order in orders] for orders, _ in pages] == \
+        [live_ids[::-1], archived_ids[:0:-1], archived_ids[:1]]
+    assert [has_next for _, has_next in pages] == [True, True, False]
+    assert all(getattr(order, 'archived', False) for order in pages[1][0])
+
+
+def test_full_live_page_does_not_read_the_archive(app, monkeypatch):
+    customer = make_customer()
+    product = make_product()
+    make_order(customer, product)
+    archive_orders(days=90)
+    live_ids = [make_order(customer, product, days_ago=1) for _ in range(3)]
+
+    def no_archive(customer_id):
+        raise AssertionError('archive index read for a page of live orders')
+    monkeypatch.setattr('website.archive.load_customer_index', no_archive)
+
+    orders, has_next = customer_orders(customer.id, 1, 2)
+    assert [order.id for order in orders] == live_ids[:0:-1]
+    assert has_next
+
+
+def test_customer_index_lists_only_their_files(app):
+    customer = make_customer()
+    other = make_customer('other@example.com')
+    product = make_product()
+    make_order(customer, product, days_ago=200)
+    make_order(other, product, days_ago=400)
+    archive_orders(days=90)
+
+    assert [entry['count'] for entry in load_customer_index(customer.id)['files']] == [1]
+    assert archived_count(other.id) == 1
+    assert 'customers' not in [key for entries in load_manifest()['partitions'].values() for entry in entries
+                               for key in entry]
+
+
+def test_vacuum_shrinks_database_file(app):
+    customer = make_customer()
+    product = make_product()
+    for _ in range(20):
+        order = Order.query.get(make_order(customer, product))
+        order.payment_id = 'x' * 5000
+    db.session.commit()
+    archive_orders(days=90)
+    path = db.engine.url.database
+    before = os.path.getsize(path)
+
+    vacuum_database()
+
+    assert os.path.getsize(path) < before
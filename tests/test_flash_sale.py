@@ -0,0 +1,117 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import event
+from website import db
+from website.models import Cart
+from website.flash_sale import MemoryStockGate, WaitingRoom, flash_sale, init_flash_sale
+from conftest import make_customer, make_product, login
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr('website.flash_sale.time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_gate_hold_release_consume_accounting(clock):
+    gate = MemoryStockGate(ttl=60)
+    gate.load(1, 3)
+
+    assert gate.reserve(1, 'a')
+    assert gate.hold(1, 'a', 2)
+    assert gate.hold(1, 'b', 1)
+    assert gate.reserve(1, 'c') is None
+    assert gate.sold_out(1)
+
+    gate.release(1, 'a', 1)
+    assert gate.reserved(1, 'a') == 1
+    assert not gate.sold_out(1)
+
+    gate.consume(1, 'b')
+    gate.load(1, 2)  # Database stock after b's order, a still holds one unit
+    assert gate.available[1] == 1
+
+
+def test_expired_reservations_return_stock(clock):
+    gate = MemoryStockGate(ttl=60)
+    gate.load(1, 1)
+    gate.hold(1, 'a', 1)
+
+    clock.now += 30
+    gate.hold(1, 'a', 1)  # Extends the reservation
+    clock.now += 45
+    assert gate.sold_out(1)
+
+    clock.now += 20
+    assert not gate.sold_out(1)
+    assert gate.reserved(1, 'a') == 0
+
+
+def test_waiting_room_admits_in_arrival_order_at_rate(clock):
+    room = WaitingRoom(rate=2, burst=2, window=60)
+
+    assert [room.admit(buyer) for buyer in 'abcde'] == [0, 0, 1, 2, 3]
+
+    clock.now += 1
+    assert [room.admit(buyer) for buyer in 'edcba'] == [1, 0, 0, 0, 0]
+
+
+def test_waiting_room_drops_used_and_stale_tickets(clock):
+    room = WaitingRoom(rate=1, burst=1, window=60)
+    assert room.admit('a') == 0
+    room.leave('a')
+    assert room.admit('b') == 1
+
+    # b is admitted here but never comes back to use it
+    clock.now += 1
+    assert room.admit('c') == 1
+    clock.now += 61
+    assert room.admit('d') == 0
+    assert 'b' not in room.tickets
+    assert room.admit('b') == 1  # Back of the queue
+
+
+def test_add_to_cart_rejects_sold_out_before_the_database(app):
+    app.config['FLASH_SALE_MODE'] = True
+    init_flash_sale(app)
+
+    product = make_product(in_stock=1, flash_sale=True)
+    first, second = make_customer('a@example.com'), make_customer('b@example.com')
+    first_client, second_client = app.test_client(), app.test_client()
+    login(first_client, first)
+    login(second_client, second)
+
+    first_client.get(f'/add-to-cart/{product.id}', headers={'Referer': '/'})
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+
+    # A new thread has no app context, so the request pushes its own like it would in production
+    responses = []
+    thread = threading.Thread(target=lambda: responses.append(
+        second_client.get(f'/add-to-cart/{product.id}', headers={'Referer': '/'})))
+    thread.start()
+    thread.join()
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert responses[0].status_code == 302
+    assert statements == []
+    with second_client.session_transaction() as session:
+        assert [message for _, message in session['_flashes']] == ['Sorry, this item is sold out']
+    assert [cart.customer_link for cart in Cart.query.all()] == [first.id]
+    assert flash_sale().gate.reserved(product.id, first.id) == 1
+
+
+def test_memory_gate_refuses_several_workers(app, monkeypatch):
+    app.config['FLASH_SALE_MODE'] = True
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    with pytest.raises(RuntimeError):
+        init_flash_sale(app)
+
+    monkeypatch.setenv('GUNICORN_CMD_ARGS', '--bind 0.0.0.0:80 --workers=1')
+    init_flash_sale(app)
+    assert flash_sale() is not None
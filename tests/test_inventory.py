@@ -0,0 +1,114 @@
+import io
+from website import db
+from website.models import Product, Order, StockMovement, StockSnapshot
+from website.inventory import record_movement, ledger_stock, reconcile, take_snapshot, SALE, RESTOCK, CORRECTION
+from conftest import make_customer, make_product, login
+
+
+def test_record_movement_appends_to_ledger_and_updates_counter(app):
+    product = make_product(in_stock=10)
+
+    record_movement(product.id, -3, SALE)
+    record_movement(product.id, 5, RESTOCK)
+    db.session.commit()
+
+    assert Product.query.get(product.id).in_stock == 12
+    assert [(m.change, m.reason) for m in StockMovement.query.order_by(StockMovement.id)] == [(-3, SALE), (5, RESTOCK)]
+
+
+def test_first_snapshot_uses_counter_as_opening_balance(app):
+    product = make_product(in_stock=10)
+    record_movement(product.id, -2, SALE)
+    db.session.commit()
+
+    assert take_snapshot() == 1
+    snapshot = StockSnapshot.query.one()
+    assert (snapshot.quantity, snapshot.last_movement_id) == (8, StockMovement.query.one().id)
+
+
+def test_ledger_stock_adds_movements_after_latest_snapshot(app):
+    product = make_product(in_stock=10)
+    take_snapshot()
+    record_movement(product.id, -4, SALE)
+    record_movement(product.id, 1, CORRECTION)
+    db.session.commit()
+    take_snapshot()
+    last = record_movement(product.id, -2, SALE)
+    db.session.commit()
+
+    assert ledger_stock() == {product.id: (5, last.id)}
+
+
+def test_reconcile_resets_drifted_counter_only(app):
+    drifted_product = make_product(in_stock=10)
+    good_product = make_product(in_stock=7)
+    take_snapshot()
+    record_movement(drifted_product.id, -1, SALE)
+    db.session.commit()
+
+    # An in-place write that bypasses the ledger
+    Product.query.filter_by(id=drifted_product.id).update({Product.in_stock: 3})
+    db.session.commit()
+
+    drifted = reconcile()
+
+    assert [(product.id, counter, expected) for product, counter, expected in drifted] == [(drifted_product.id, 3, 9)]
+    assert Product.query.get(drifted_product.id).in_stock == 9
+    assert Product.query.get(good_product.id).in_stock == 7
+
+
+def test_reconcile_leaves_products_without_snapshot(app):
+    product = make_product(in_stock=10)
+    Product.query.filter_by(id=product.id).update({Product.in_stock: 4})
+    db.session.commit()
+
+    assert reconcile() == []
+    assert Product.query.get(product.id).in_stock == 4
+
+
+def test_cancelling_an_order_restocks_it(app):
+    admin = make_customer('admin@example.com')
+    product = make_product(in_stock=10)
+    order = Order()
+    order.quantity = 3
+    order.price = product.current_price
+    order.status = 'Pending'
+    order.payment_id = 'test'
+    order.product_link = product.id
+    order.customer_link = admin.id
+    db.session.add(order)
+    record_movement(product.id, -3, SALE, order)
+    db.session.commit()
+
+    client = app.test_client()
+    login(client, admin)
+    client.post(f'/update-order/{order.id}', data={'order_status': 'Canceled'})
+
+    assert Product.query.get(product.id).in_stock == 10
+    assert StockMovement.query.order_by(StockMovement.id.desc()).first().order_link == order.id
+
+
+def test_admin_correction_lands_on_entered_stock_despite_concurrent_sale(app, monkeypatch):
+    admin = make_customer('admin@example.com')
+    product = make_product(in_stock=10)
+    product_id = product.id
+
+    def save_during_sale(file_storage, destination):
+        # A sale commits on another connection while the upload is being saved
+        with db.engine.begin() as connection:
+            connection.execute(Product.__table__.update().where(Product.__table__.c.id == product_id)
+                               .values(in_stock=Product.__table__.c.in_stock - 2))
+            connection.execute(StockMovement.__table__.insert().values(change=-2, reason=SALE,
+                                                                       product_link=product_id))
+    monkeypatch.setattr('werkzeug.datastructures.FileStorage.save', save_during_sale)
+
+    client = app.test_client()
+    login(client, admin)
+    client.post(f'/update-item/{product_id}', content_type='multipart/form-data', data={
+        'product_name': 'Test Item', 'current_price': 100, 'previous_price': 120, 'in_stock': 15,
+        'product_picture': (io.BytesIO(b'image'), 'test.jpg'),
+    })
+
+    db.session.expire_all()
+    assert Product.query.get(product_id).in_stock == 15
+    assert StockMovement.query.order_by(StockMovement.id.desc()).first().change == 7
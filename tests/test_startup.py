@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import click
+from website import create_app
+from website.startup import compile_templates, warm_up
+
+TEMPLATES = os.path.join(os.path.dirname(__file__), '..', 'website', 'templates')
+
+
+def test_compile_templates_fills_bytecode_cache(app):
+    cache_dir = app.config['JINJA_CACHE_DIR']
+
+    count = compile_templates(app)
+
+    assert count == len([name for name in os.listdir(TEMPLATES) if name.endswith('.html')])
+    assert len([name for name in os.listdir(cache_dir) if name.endswith('.cache')]) == count
+
+
+def test_views_do_not_import_payment_sdk(tmp_path):
+    # A stand-in intasend on the path shows up in sys.modules if anything imports it
+    (tmp_path / 'intasend.py').write_text('APIService = None\n')
+    root = os.path.join(os.path.dirname(__file__), '..')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), root]))
+
+    result = subprocess.run([sys.executable, '-c', 'import sys, website.views; print("intasend" in sys.modules)'],
+                            capture_output=True, text=True, env=env, cwd=root, check=True)
+
+    assert result.stdout.strip() == 'False'
+
+
+def test_warm_up_reports_failing_pages(tmp_path, capsys):
+    # No tables were created, so the home page fails with a 500
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "empty.sqlite3"}',
+                      'JINJA_CACHE_DIR': str(tmp_path / 'jinja_cache')})
+
+    warm_up(app)
+
+    assert 'Warm-up request failed / 500' in capsys.readouterr().out
+
+
+def test_warm_up_is_skipped_for_cli_commands(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr('website.warm_up', calls.append)
+    config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "cli.sqlite3"}',
+              'JINJA_CACHE_DIR': str(tmp_path / 'jinja_cache'), 'WARM_UP': True}
+
+    with click.Context(click.Command('upgrade')):
+        create_app(config)
+    assert calls == []
+
+    create_app(config)
+    assert len(calls) == 1
@@ -1,6 +1,7 @@
 from flask import Flask, render_template
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from .startup import configure_template_cache, warm_up, running_cli, templates_cli
 
 
 db = SQLAlchemy()
@@ -12,10 +13,29 @@ def create_database():
     print('Database Created')
 
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'hbnwdvbn ajnbsjn ahe'
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_NAME}'
+    app.config['WARM_UP'] = False          # Pre-render hot templates before serving
+    app.config['WARM_UP_PATHS'] = ['/']
+    app.config['ARCHIVE_AFTER_DAYS'] = 90  # Delivered or cancelled orders older than this are archived
+    app.config['ARCHIVE_BATCH_SIZE'] = 500
+    app.config['ORDERS_PER_PAGE'] = 20
+    app.config['FLASH_SALE_MODE'] = False  # Gate flash sale products in memory, see flash_sale.py
+    app.config['FLASH_SALE_GATE'] = 'website.flash_sale.MemoryStockGate'
+    app.config['FLASH_SALE_ADMIT_RATE'] = 50  # Buyers let out of the waiting room per second
+    app.config['FLASH_SALE_ADMIT_BURST'] = 50
+    app.config['FLASH_SALE_ADMISSION_WINDOW'] = 120  # Seconds an admitted buyer has to use their turn
+    app.config['FLASH_SALE_RESERVATION_TTL'] = 600  # Seconds before unpaid reservations return their stock
+    app.config['FLASH_SALE_WORKERS'] = None  # Worker count when gunicorn gets it from a config file
+
+    app.config.from_prefixed_env()  # e.g. FLASK_WARM_UP=true in the worker environment
+
+    if test_config is not None:
+        app.config.update(test_config)
+
+    configure_template_cache(app)
 
     db.init_app(app)
 
@@ -36,12 +56,26 @@ def create_app():
     from .views import views
     from .auth import auth
     from .admin import admin
-    from .models import Customer, Cart, Product, Order
+    from .models import Customer, Cart, Product, Order, StockMovement, StockSnapshot
+    from .inventory import inventory_cli
+    from .schema import db_cli
+    from .archive import archive_cli
+    from .flash_sale import init_flash_sale
 
     app.register_blueprint(views, url_prefix='/') # localhost:5000/about-us
     app.register_blueprint(auth, url_prefix='/') # localhost:5000/auth/change-password
     app.register_blueprint(admin, url_prefix='/')
 
+    app.cli.add_command(db_cli)  # flask --app main db upgrade
+    app.cli.add_command(inventory_cli)  # flask --app main inventory snapshot
+    app.cli.add_command(templates_cli)  # flask --app main templates compile
+    app.cli.add_command(archive_cli)  # flask --app main archive orders
+
+    init_flash_sale(app)
+
+    if app.config['WARM_UP'] and not running_cli():
+        warm_up(app)
+
     # with app.app_context():
     #     create_database()
 
@@ -4,6 +4,8 @@ from .forms import ShopItemsForm, OrderForm
 from werkzeug.utils import secure_filename
 from .models import Product, Order, Customer
 from . import db
+from .inventory import record_movement, RESTOCK, CORRECTION, CANCELLATION, SALE
+from .flash_sale import sync_product, flash_sale as current_flash_sale
 
 # Create a Blueprint for admin-related routes
 admin = Blueprint('admin', __name__)
@@ -39,14 +41,18 @@ def add_shop_items():
             new_shop_item.product_name = product_name
             new_shop_item.current_price = current_price
             new_shop_item.previous_price = previous_price
-            new_shop_item.in_stock = in_stock
+            new_shop_item.in_stock = 0  # Opening stock is recorded in the ledger below
             new_shop_item.flash_sale = flash_sale
             new_shop_item.product_picture = file_path
 
             try:
                 # Add the product to the database
                 db.session.add(new_shop_item)
+                db.session.flush()
+                if in_stock:
+                    record_movement(new_shop_item.id, in_stock, RESTOCK)
                 db.session.commit()
+                sync_product(new_shop_item)
                 flash(f'{product_name} added Successfully')
                 print('Product Added')
                 return render_template('add_shop_items.html', form=form)
@@ -102,11 +108,17 @@ def update_item(item_id):
                 Product.query.filter_by(id=item_id).update(dict(product_name=product_name,
                                                                 current_price=current_price,
                                                                 previous_price=previous_price,
-                                                                in_stock=in_stock,
                                                                 flash_sale=flash_sale,
                                                                 product_picture=file_path))
 
+                # Stock changes go through the inventory ledger as a correction. The update above holds
+                # the write lock, so re-reading the counter here sees every sale committed before it
+                current_stock = db.session.query(Product.in_stock).filter_by(id=item_id).scalar()
+                if in_stock != current_stock:
+                    record_movement(item_id, in_stock - current_stock, CORRECTION)
+
                 db.session.commit()
+                sync_product(item_to_update)  # Keep the flash sale gate in line with the new stock
                 flash(f'{product_name} updated Successfully')
                 print('Product Updated')
                 return redirect('/shop-items')
@@ -127,6 +139,10 @@ def delete_item(item_id):
             item_to_delete = Product.query.get(item_id)
             db.session.delete(item_to_delete)
             db.session.commit()
+
+            sale = current_flash_sale()
+            if sale is not None:
+                sale.forget(item_id)
             flash('One Item deleted')
             return redirect('/shop-items')
         except Exception as e:
@@ -157,14 +173,24 @@ def update_order(order_id):
         if form.validate_on_submit():  # Process form submission
             # Update order status
             status = form.order_status.data
+            previous_status = order.status
             order.status = status
 
             try:
+                # Cancelled orders return their stock, un-cancelled orders take it again
+                if status == 'Canceled' and previous_status != 'Canceled':
+                    record_movement(order.product_link, order.quantity, CANCELLATION, order)
+                elif previous_status == 'Canceled' and status != 'Canceled':
+                    record_movement(order.product_link, -order.quantity, SALE, order)
+
                 db.session.commit()
+                if 'Canceled' in (status, previous_status):
+                    sync_product(order.product)  # Stock moved, the flash sale gate follows it
                 flash(f'Order {order_id} Updated successfully')
                 return redirect('/view-orders')
             except Exception as e:
                 print(e)
+                db.session.rollback()
                 flash(f'Order {order_id} not updated')
                 return redirect('/view-orders')
 
@@ -0,0 +1,306 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+from .models import Order
+from . import db
+
+# Orders in these statuses never change again and can be moved to the archive
+TERMINAL_STATUSES = ('Delivered', 'Canceled')
+
+# CLI group for archival, e.g. `flask --app main archive orders` from cron
+archive_cli = AppGroup('archive', help='Move old orders to compressed archive files.')
+
+
+def archive_dir():
+    return current_app.config.get('ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+
+
+def load_manifest():
+    """
+    Returns the archive manifest: {'partitions': {month: [file entry, ...]}}, where each file entry
+    holds 'file', 'count', 'first_id' and 'last_id'. Files not listed here are never read.
+    """
+    return load_json('manifest.json', {'partitions': {}})
+
+
+def save_manifest(manifest):
+    manifest['updated'] = datetime.utcnow().isoformat()
+    save_json('manifest.json', manifest)
+
+
+def load_customer_index(customer_id):
+    """
+    Returns one customer's archive index: {'files': [{'file', 'month', 'count'}]}, listing the archive
+    files holding their orders and how many. The orders page only ever reads this small file.
+    """
+    return load_json(f'customers/{customer_id}.json', {'files': []})
+
+
+def add_to_customer_indexes(file_name, month, records):
+    counts = {}
+    for record in records:
+        counts[record['customer_link']] = counts.get(record['customer_link'], 0) + 1
+
+    for customer_id, count in counts.items():
+        index = load_customer_index(customer_id)
+        if file_name not in {entry['file'] for entry in index['files']}:
+            index['files'].append({'file': file_name, 'month': month, 'count': count})
+            save_json(f'customers/{customer_id}.json', index)
+
+
+def load_json(name, default):
+    path = os.path.join(archive_dir(), name)
+    if not os.path.exists(path):
+        return default
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def save_json(name, data):
+    # Write to a temporary file and swap it in so readers never see a half written file
+    path = os.path.join(archive_dir(), name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as json_file:
+        json.dump(data, json_file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def order_record(order):
+    """
+    Flattens an order into the JSON record stored in the archive. Product details are copied so
+    archived orders still render after the product is deleted.
+    """
+    return {
+        'id': order.id,
+        'quantity': order.quantity,
+        'price': order.price,
+        'status': order.status,
+        'payment_id': order.payment_id,
+        'date_ordered': order.date_ordered.isoformat(),
+        'customer_link': order.customer_link,
+        'product_link': order.product_link,
+        'product_name': order.product.product_name if order.product else None,
+        'product_picture': order.product.product_picture if order.product else None,
+    }
+
+
+def read_records(file_name):
+    with gzip.open(os.path.join(archive_dir(), file_name), 'rt', encoding='utf-8') as archive_file:
+        return [json.loads(line) for line in archive_file]
+
+
+def write_records(file_name, records):
+    """
+    Writes a complete archive file under a temporary name, syncs it and then renames it into place,
+    so a file under its final name is never partly written.
+    """
+    path = os.path.join(archive_dir(), file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as raw_file:
+        with gzip.open(raw_file, 'wt', encoding='utf-8') as archive_file:
+            for record in records:
+                archive_file.write(json.dumps(record) + '\n')
+        raw_file.flush()
+        os.fsync(raw_file.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def file_entry(file_name, records):
+    return {'file': file_name, 'count': len(records),
+            'first_id': min(r['id'] for r in records), 'last_id': max(r['id'] for r in records)}
+
+
+def recover_files(manifest):
+    """
+    Settles archive files left behind by an interrupted run. A file whose orders are still in the
+    database was written before a delete that never committed, so it is removed. A file whose
+    orders are gone was committed before the manifest was saved, so it is added to the manifest.
+    """
+    listed = {entry['file'] for entries in manifest['partitions'].values() for entry in entries}
+    changed = False
+
+    for month in os.listdir(archive_dir()):
+        month_dir = os.path.join(archive_dir(), month)
+        if month == 'customers' or not os.path.isdir(month_dir):
+            continue
+        for name in os.listdir(month_dir):
+            file_name = f'{month}/{name}'
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(month_dir, name))
+            elif file_name not in listed:
+                records = read_records(file_name)
+                if Order.query.filter(Order.id.in_([r['id'] for r in records])).count():
+                    os.remove(os.path.join(month_dir, name))
+                else:
+                    add_to_customer_indexes(file_name, month, records)
+                    manifest['partitions'].setdefault(month, []).append(file_entry(file_name, records))
+                    changed = True
+
+    if changed:
+        save_manifest(manifest)
+
+
+def archive_orders(days=None, batch_size=None):
+    """
+    Moves orders in a terminal status that are older than `days` into gzipped JSONL files, one per
+    batch and month, and deletes them from the database. Each batch is committed separately so the
+    database is never locked for long. Orders without a date are of unknown age and stay in the
+    database. Returns the number of orders archived.
+    """
+    days = days if days is not None else current_app.config['ARCHIVE_AFTER_DAYS']
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    os.makedirs(archive_dir(), exist_ok=True)
+    manifest = load_manifest()
+    recover_files(manifest)
+    archived = 0
+    last_id = 0
+
+    while True:
+        batch = Order.query.filter(Order.id > last_id, Order.status.in_(TERMINAL_STATUSES),
+                                   Order.date_ordered < cutoff) \
+            .order_by(Order.id).limit(batch_size).all()
+        if not batch:
+            break
+
+        partitions = {}
+        for order in batch:
+            partitions.setdefault(order.date_ordered.strftime('%Y-%m'), []).append(order_record(order))
+
+        # Files are on disk before the rows are deleted, but only listed once the delete commits
+        files = {}
+        for month, records in partitions.items():
+            file_name = f'{month}/orders-{records[0]["id"]:08d}-{records[-1]["id"]:08d}.jsonl.gz'
+            write_records(file_name, records)
+            files[month] = file_name
+
+        ids = [order.id for order in batch]
+        try:
+            Order.query.filter(Order.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # Customer indexes first: a crash before the manifest is saved leaves a file that the next
+        # run adopts, and adopting skips indexes that already list it
+        for month, file_name in files.items():
+            add_to_customer_indexes(file_name, month, partitions[month])
+            manifest['partitions'].setdefault(month, []).append(file_entry(file_name, partitions[month]))
+        save_manifest(manifest)
+
+        archived += len(batch)
+        last_id = ids[-1]
+
+    return archived
+
+
+def archived_count(customer_id, index=None):
+    index = index or load_customer_index(customer_id)
+    return sum(entry['count'] for entry in index['files'])
+
+
+def archived_orders(customer_id, offset, limit, index=None):
+    """
+    Returns up to `limit` archived orders of a customer, newest first, skipping the first `offset`.
+    Only the files of the months that hold the requested page are opened.
+    """
+    index = index or load_customer_index(customer_id)
+    months = {}
+    for entry in index['files']:
+        months.setdefault(entry['month'], []).append(entry)
+    orders = []
+
+    for month in sorted(months, reverse=True):
+        count = sum(entry['count'] for entry in months[month])
+        if count <= offset:
+            offset -= count  # Whole month is before the requested page
+            continue
+
+        records = [record for entry in months[month] for record in read_records(entry['file'])
+                   if record['customer_link'] == customer_id]
+
+        for record in sorted(records, key=lambda r: r['id'], reverse=True)[offset:]:
+            orders.append(archived_order(record))
+            if len(orders) == limit:
+                return orders
+        offset = 0
+
+    return orders
+
+
+def find_archived_order(order_id, manifest=None):
+    """
+    Looks up one archived order by id, e.g. to resolve StockMovement.order_link once the order has
+    left the database. Returns None when the order is not in the archive.
+    """
+    manifest = manifest or load_manifest()
+    for entries in manifest['partitions'].values():
+        for entry in entries:
+            if entry['first_id'] <= order_id <= entry['last_id']:
+                for record in read_records(entry['file']):
+                    if record['id'] == order_id:
+                        return archived_order(record)
+    return None
+
+
+def archived_order(record):
+    """
+    Wraps an archive record so templates can use it like an Order.
+    """
+    product = SimpleNamespace(product_name=record['product_name'], product_picture=record['product_picture'])
+    return SimpleNamespace(product=product, archived=True, **record)
+
+
+def customer_orders(customer_id, page, per_page):
+    """
+    Returns (orders, has_next) for one page of a customer's order history, newest first. Live
+    orders come first, and the customer's archive index is only read once they run out.
+    """
+    offset = (page - 1) * per_page
+    live = Order.query.filter_by(customer_link=customer_id)
+
+    # One extra row tells whether another page follows while live orders last
+    orders = live.order_by(Order.id.desc()).offset(offset).limit(per_page + 1).all()
+    if len(orders) > per_page:
+        return orders[:per_page], True
+
+    index = load_customer_index(customer_id)
+    live_count = live.count()
+    if len(orders) < per_page:
+        # An order archived since the live query would show up twice, keep the live copy
+        live_ids = {order.id for order in orders}
+        archived = archived_orders(customer_id, max(offset - live_count, 0), per_page - len(orders), index)
+        orders += [order for order in archived if order.id not in live_ids]
+
+    total = live_count + archived_count(customer_id, index)
+    return orders, offset + per_page < total
+
+
+def vacuum_database():
+    """
+    Rebuilds the SQLite file so the space freed by archived orders is returned to the file system.
+    VACUUM locks the whole database while it runs, so schedule it for a quiet time.
+    """
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text('VACUUM'))
+
+
+@archive_cli.command('orders')
+@click.option('--days', type=int, default=None, help='Archive orders older than this many days.')
+@click.option('--batch-size', type=int, default=None, help='Orders moved per transaction.')
+@click.option('--vacuum', is_flag=True, help='VACUUM the database afterwards so the file shrinks. Locks it while running.')
+def archive_orders_command(days, batch_size, vacuum):
+    """Move old delivered and cancelled orders to the archive."""
+    count = archive_orders(days, batch_size)
+    print(f'{count} order(s) archived')
+    if vacuum and count:
+        vacuum_database()
+        print('Database vacuumed')
@@ -0,0 +1,311 @@
+import argparse
+import heapq
+from collections import deque
+from functools import wraps
+import os
+import secrets
+import shlex
+import sys
+import threading
+import time
+from flask import current_app, flash, g, redirect, request, session
+from werkzeug.utils import import_string
+from .models import Product
+
+
+class MemoryStockGate:
+    """
+    In-process stock gate for flash-sale products. Buyers reserve units here before any database
+    work, and reservations that are not turned into orders expire and return their stock.
+
+    Counts live in this worker only, so an admin restock or cancellation only reaches the worker
+    that served it and every worker would sell the full stock. init_flash_sale() refuses to start
+    this gate with more than one worker, point FLASH_SALE_GATE at a shared implementation (e.g.
+    backed by Redis) with the same methods and `per_worker = False` to run several.
+    """
+
+    per_worker = True
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.available = {}     # product id -> units not yet reserved
+        self.reservations = {}  # token -> [product id, customer id, quantity, expiry]
+        self.tokens = {}        # (product id, customer id) -> token
+        self.expiries = []      # heap of (expiry, token)
+
+    def tracks(self, product_id):
+        return product_id in self.available
+
+    def sold_out(self, product_id):
+        with self.lock:
+            self._expire()
+            return self.available.get(product_id, 0) <= 0
+
+    def load(self, product_id, in_stock):
+        """Starts gating a product, or resyncs it, from its stock level in the database."""
+        with self.lock:
+            self._expire()
+            reserved = sum(r[2] for r in self.reservations.values() if r[0] == product_id)
+            self.available[product_id] = max(in_stock - reserved, 0)
+
+    def forget(self, product_id):
+        """Stops gating a product, e.g. when it leaves the flash sale."""
+        with self.lock:
+            for key in [key for key in self.tokens if key[0] == product_id]:
+                del self.reservations[self.tokens.pop(key)]
+            self.available.pop(product_id, None)
+
+    def reserved(self, product_id, customer_id):
+        with self.lock:
+            self._expire()
+            token = self.tokens.get((product_id, customer_id))
+            return self.reservations[token][2] if token else 0
+
+    def reserve(self, product_id, customer_id, quantity=1):
+        """Reserves `quantity` more units. Returns the reservation token, or None if sold out."""
+        with self.lock:
+            self._expire()
+            token = self.tokens.get((product_id, customer_id))
+            held = self.reservations[token][2] if token else 0
+            return self._hold(product_id, customer_id, held + quantity)
+
+    def hold(self, product_id, customer_id, quantity):
+        """Makes the reservation exactly `quantity` units. Returns the token, or None if sold out."""
+        with self.lock:
+            self._expire()
+            return self._hold(product_id, customer_id, quantity)
+
+    def release(self, product_id, customer_id, quantity=None):
+        """Returns reserved units to the gate, all of them when `quantity` is None."""
+        with self.lock:
+            token = self.tokens.get((product_id, customer_id))
+            if token is None:
+                return
+            held = self.reservations[token][2]
+            if quantity is None or quantity >= held:
+                self._drop(token, restock=True)
+            else:
+                self.reservations[token][2] -= quantity
+                self.available[product_id] = self.available.get(product_id, 0) + quantity
+
+    def consume(self, product_id, customer_id):
+        """Turns a reservation into a sale once the order is placed, its units don't come back."""
+        with self.lock:
+            token = self.tokens.get((product_id, customer_id))
+            if token is not None:
+                self._drop(token, restock=False)
+
+    def _hold(self, product_id, customer_id, quantity):
+        key = (product_id, customer_id)
+        token = self.tokens.get(key)
+        held = self.reservations[token][2] if token else 0
+        extra = quantity - held
+        if extra > self.available.get(product_id, 0):
+            return None
+
+        if token is None:
+            token = secrets.token_urlsafe(16)
+            self.tokens[key] = token
+            self.reservations[token] = [product_id, customer_id, 0, 0]
+
+        expiry = time.monotonic() + self.ttl
+        self.available[product_id] -= extra
+        self.reservations[token][2] = quantity
+        self.reservations[token][3] = expiry
+        heapq.heappush(self.expiries, (expiry, token))
+        return token
+
+    def _drop(self, token, restock):
+        product_id, customer_id, quantity, expiry = self.reservations.pop(token)
+        del self.tokens[(product_id, customer_id)]
+        if restock and product_id in self.available:
+            self.available[product_id] += quantity
+
+    def _expire(self):
+        now = time.monotonic()
+        while self.expiries and self.expiries[0][0] <= now:
+            expiry, token = heapq.heappop(self.expiries)
+            reservation = self.reservations.get(token)
+            if reservation is not None and reservation[3] == expiry:  # Skip released or extended ones
+                self._drop(token, restock=True)
+
+
+class WaitingRoom:
+    """
+    Fair FIFO waiting room for one flash sale product. Every buyer gets a ticket on arrival and
+    tickets are admitted in order at `rate` buyers per second, with up to `burst` admitted at once
+    when the room is quiet. A ticket is dropped once the buyer has used their admission, or
+    `window` seconds after it was admitted if they never come back, and they queue again next time.
+    """
+
+    def __init__(self, rate, burst, window):
+        self.rate = rate
+        self.burst = burst
+        self.window = window
+        self.lock = threading.Lock()
+        self.tickets = {}        # customer id -> ticket
+        self.waiting = deque()   # (ticket, customer id) not yet admitted, in arrival order
+        self.admitted = deque()  # (time admitted, ticket, customer id), oldest first
+        self.next_ticket = 0
+        self.frontier = burst  # Tickets below this are admitted
+        self.updated = time.monotonic()
+
+    def admit(self, customer_id):
+        """Returns 0 when the buyer is admitted, otherwise their position in the queue."""
+        with self.lock:
+            now = time.monotonic()
+            self.frontier = min(self.frontier + (now - self.updated) * self.rate, self.next_ticket + self.burst)
+            self.updated = now
+
+            while self.admitted and now - self.admitted[0][0] > self.window:
+                _, ticket, customer = self.admitted.popleft()
+                if self.tickets.get(customer) == ticket:
+                    del self.tickets[customer]
+
+            ticket = self.tickets.get(customer_id)
+            if ticket is None:
+                ticket = self.tickets[customer_id] = self.next_ticket
+                self.waiting.append((ticket, customer_id))
+                self.next_ticket += 1
+
+            admitted = int(self.frontier)
+            while self.waiting and self.waiting[0][0] < admitted:
+                waiting_ticket, customer = self.waiting.popleft()
+                self.admitted.append((now, waiting_ticket, customer))
+
+            return 0 if ticket < admitted else ticket - admitted + 1
+
+    def leave(self, customer_id):
+        """Drops the buyer's ticket once their admission has been used."""
+        with self.lock:
+            self.tickets.pop(customer_id, None)
+
+
+class FlashSale:
+    """
+    Per-app flash-sale state, kept in app.extensions['flash_sale'].
+    """
+
+    def __init__(self, app):
+        self.gate = import_string(app.config['FLASH_SALE_GATE'])(app.config['FLASH_SALE_RESERVATION_TTL'])
+        self.config = app.config
+        self.rooms = {}  # product id -> WaitingRoom
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def room(self, product_id):
+        """Returns the waiting room of one flash sale product, each product queues separately."""
+        with self.lock:
+            if product_id not in self.rooms:
+                self.rooms[product_id] = WaitingRoom(self.config['FLASH_SALE_ADMIT_RATE'],
+                                                     self.config['FLASH_SALE_ADMIT_BURST'],
+                                                     self.config['FLASH_SALE_ADMISSION_WINDOW'])
+            return self.rooms[product_id]
+
+    def forget(self, product_id):
+        """Stops gating a product and closes its waiting room."""
+        self.gate.forget(product_id)
+        with self.lock:
+            self.rooms.pop(product_id, None)
+
+    def load(self):
+        # Each worker reads flash-sale stock from the database once, on first use
+        with self.lock:
+            if not self.loaded:
+                for product in Product.query.filter_by(flash_sale=True):
+                    self.gate.load(product.id, product.in_stock)
+                self.loaded = True
+
+
+def worker_count(app):
+    """
+    Number of gunicorn workers serving the app: FLASH_SALE_WORKERS when set, otherwise -w/--workers
+    from the gunicorn command line or GUNICORN_CMD_ARGS, otherwise WEB_CONCURRENCY, otherwise 1.
+    Workers set in a gunicorn config file are not seen, set FLASH_SALE_WORKERS to match.
+    """
+    if app.config.get('FLASH_SALE_WORKERS'):
+        return int(app.config['FLASH_SALE_WORKERS'])
+
+    args = shlex.split(os.environ.get('GUNICORN_CMD_ARGS', ''))
+    if os.path.basename(sys.argv[0]) == 'gunicorn':
+        args += sys.argv[1:]  # Workers are forked from the master, so they share its command line
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('-w', '--workers', type=int)
+    workers = parser.parse_known_args(args)[0].workers
+    return workers or int(os.environ.get('WEB_CONCURRENCY', 1))
+
+
+def init_flash_sale(app):
+    if app.config['FLASH_SALE_MODE']:
+        sale = FlashSale(app)
+        workers = worker_count(app)
+        if getattr(sale.gate, 'per_worker', False) and workers > 1:
+            raise RuntimeError(f'{app.config["FLASH_SALE_GATE"]} keeps stock in one worker but {workers} workers '
+                               f'are running, run a single worker or use a shared FLASH_SALE_GATE')
+        app.extensions['flash_sale'] = sale
+
+
+def flash_sale():
+    """
+    Returns the app's FlashSale with its stock loaded, or None when flash sale mode is off.
+    """
+    state = current_app.extensions.get('flash_sale')
+    if state is not None and not state.loaded:
+        state.load()
+    return state
+
+
+def admit_buyer(sale, product_id, customer_id):
+    """
+    Turns a buyer away when a gated product is sold out or the waiting room has not reached them yet.
+    Returns the redirect to send back, or None when the buyer may go on to the cart.
+    """
+    if sale.gate.sold_out(product_id):
+        flash('Sorry, this item is sold out')
+        return redirect(request.referrer)
+
+    position = sale.room(product_id).admit(customer_id)
+    if position:
+        flash(f'The flash sale is busy, you are number {position} in the queue. Please try again shortly')
+        return redirect(request.referrer)
+
+    g.flash_sale_admitted = product_id
+    return None
+
+
+def flash_sale_admission(view):
+    """
+    Runs admit_buyer() ahead of @login_required, keyed on the user id in the session, so a rush on a
+    sold out or busy product is answered from memory without loading the user from the database.
+    Requests without a user id in the session fall through to the view.
+    """
+    @wraps(view)
+    def wrapper(item_id, **kwargs):
+        sale = flash_sale()
+        customer_id = session.get('_user_id')
+        if sale is not None and customer_id is not None and sale.gate.tracks(item_id):
+            response = admit_buyer(sale, item_id, int(customer_id))
+            if response is not None:
+                return response
+        return view(item_id, **kwargs)
+    return wrapper
+
+
+def flash_gate():
+    state = flash_sale()
+    return state.gate if state is not None else None
+
+
+def sync_product(product):
+    """
+    Brings the gate in line with a product after an admin edit or a cancellation.
+    """
+    sale = flash_sale()
+    if sale is None:
+        return
+    if product.flash_sale:
+        sale.gate.load(product.id, product.in_stock)
+    else:
+        sale.forget(product.id)
@@ -0,0 +1,133 @@
+from flask.cli import AppGroup
+from sqlalchemy import func, select, update
+from .models import Product, StockMovement, StockSnapshot
+from . import db
+
+# Reasons recorded against each ledger entry
+SALE = 'Sale'
+RESTOCK = 'Restock'
+CANCELLATION = 'Cancellation'
+CORRECTION = 'Correction'
+
+# CLI group for ledger maintenance, e.g. `flask --app main inventory snapshot` from cron
+inventory_cli = AppGroup('inventory', help='Maintain the stock ledger and snapshots.')
+
+
+def record_movement(product_id, change, reason, order=None):
+    """
+    Appends a stock change to the ledger and applies it to the Product.in_stock counter.
+    The counter is updated with a single relative UPDATE so concurrent writers never overwrite
+    each other's changes. The caller is responsible for committing the session.
+    """
+    if order is not None and order.id is None:
+        db.session.flush()  # Make sure the order has an id to link to
+
+    movement = StockMovement()
+    movement.change = change
+    movement.reason = reason
+    movement.product_link = product_id
+    movement.order_link = order.id if order is not None else None
+
+    db.session.add(movement)
+    Product.query.filter_by(id=product_id).update({Product.in_stock: Product.in_stock + change})
+
+    return movement
+
+
+def ledger_stock():
+    """
+    Computes the stock level of every snapshotted product from its latest snapshot plus the
+    ledger entries recorded after it. Returns {product_id: (quantity, last_movement_id)}.
+    """
+    latest_ids = db.session.query(func.max(StockSnapshot.id)).group_by(StockSnapshot.product_link)
+    rows = db.session.query(StockSnapshot.product_link,
+                            StockSnapshot.quantity + func.coalesce(func.sum(StockMovement.change), 0),
+                            func.coalesce(func.max(StockMovement.id), StockSnapshot.last_movement_id)) \
+        .outerjoin(StockMovement, (StockMovement.product_link == StockSnapshot.product_link) &
+                   (StockMovement.id > StockSnapshot.last_movement_id)) \
+        .filter(StockSnapshot.id.in_(latest_ids)) \
+        .group_by(StockSnapshot.id)
+
+    return {product_id: (quantity, last_movement_id) for product_id, quantity, last_movement_id in rows}
+
+
+def ledger_expression():
+    """
+    SQL expression for a product's stock level according to its latest snapshot and the ledger
+    entries after it, correlated to the Product row it is used against.
+    """
+    def latest(column):
+        return select(column).where(StockSnapshot.product_link == Product.id) \
+            .order_by(StockSnapshot.id.desc()).limit(1).correlate(Product).scalar_subquery()
+
+    changes = select(func.coalesce(func.sum(StockMovement.change), 0)) \
+        .where(StockMovement.product_link == Product.id, StockMovement.id > latest(StockSnapshot.last_movement_id)) \
+        .correlate(Product).scalar_subquery()
+    quantity = latest(StockSnapshot.quantity)
+    return quantity + changes
+
+
+def reconcile():
+    """
+    Compares each Product.in_stock counter against the ledger and resets any counter that has
+    drifted. Returns a list of (product, counter value, ledger value) for the corrected products.
+    """
+    stock = ledger_stock()
+    drifted = [(product, product.in_stock, stock[product.id][0])
+               for product in Product.query.filter(Product.id.in_(list(stock))).all()
+               if product.in_stock != stock[product.id][0]]
+
+    # The reset recomputes the ledger value inside a single UPDATE, so a sale committed since
+    # the read above is counted rather than overwritten
+    expected = ledger_expression()
+    db.session.execute(update(Product)
+                       .where(Product.id.in_(select(StockSnapshot.product_link)), Product.in_stock != expected)
+                       .values(in_stock=expected),
+                       execution_options={'synchronize_session': False})
+    db.session.commit()
+    return drifted
+
+
+def take_snapshot():
+    """
+    Records a new snapshot for every product. Products without a previous snapshot use their
+    current counter as the opening balance. Returns the number of snapshots written.
+    """
+    stock = ledger_stock()
+
+    # Counter and last ledger entry are read in one statement so they agree with each other
+    last_movement_id = select(func.coalesce(func.max(StockMovement.id), 0)) \
+        .where(StockMovement.product_link == Product.id).scalar_subquery()
+    count = 0
+
+    for product_id, in_stock, last_id in db.session.query(Product.id, Product.in_stock, last_movement_id).all():
+        snapshot = StockSnapshot()
+        snapshot.product_link = product_id
+        if product_id in stock:
+            snapshot.quantity, snapshot.last_movement_id = stock[product_id]
+        else:
+            snapshot.quantity = in_stock
+            snapshot.last_movement_id = last_id
+
+        db.session.add(snapshot)
+        count += 1
+
+    db.session.commit()
+    return count
+
+
+@inventory_cli.command('reconcile')
+def reconcile_command():
+    """Reset stock counters that have drifted from the ledger."""
+    drifted = reconcile()
+    for product, counter, expected in drifted:
+        print(f'{product.product_name}: counter {counter} reset to ledger value {expected}')
+    print(f'{len(drifted)} product(s) corrected')
+
+
+@inventory_cli.command('snapshot')
+def snapshot_command():
+    """Reconcile the stock counters, then snapshot every product."""
+    drifted = reconcile()
+    count = take_snapshot()
+    print(f'{len(drifted)} product(s) corrected, {count} snapshot(s) taken')
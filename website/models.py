@@ -5,7 +5,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 # Define the Customer model, representing a user in the application
 class Customer(db.Model, UserMixin):
-        """
+    """
     Model for a customer in the application. Includes login functionality and
     relationships to carts and orders.
     """
@@ -82,6 +82,7 @@ class Order(db.Model):
     price = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(100), nullable=False)
     payment_id = db.Column(db.String(1000), nullable=False)
+    date_ordered = db.Column(db.DateTime, default=datetime.utcnow)
 
     customer_link = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     product_link = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
@@ -92,3 +93,35 @@ class Order(db.Model):
     def __str__(self):
         return '<Order %r>' % self.id
 
+
+
+class StockMovement(db.Model):
+    """
+    Append-only ledger entry for a change in a product's stock level. Rows are never updated or deleted.
+    Once an order is archived, order_link resolves through archive.find_archived_order by the same id.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    change = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(100), nullable=False)
+    date_recorded = db.Column(db.DateTime, default=datetime.utcnow)
+
+    product_link = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    order_link = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=True)
+
+    def __str__(self):
+        return '<StockMovement %r>' % self.id
+
+
+class StockSnapshot(db.Model):
+    """
+    Periodic snapshot of a product's stock level, covering every ledger entry up to last_movement_id.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    last_movement_id = db.Column(db.Integer, nullable=False, default=0)
+    date_taken = db.Column(db.DateTime, default=datetime.utcnow)
+
+    product_link = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+
+    def __str__(self):
+        return '<StockSnapshot %r>' % self.id
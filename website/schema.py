@@ -0,0 +1,27 @@
+from flask.cli import AppGroup
+from sqlalchemy import inspect, text
+from . import db
+
+# CLI group for schema changes, e.g. `flask --app main db upgrade` after pulling new models
+db_cli = AppGroup('db', help='Create or upgrade the database schema.')
+
+
+def upgrade():
+    """
+    Brings an existing database up to the current models. Missing tables are created, and columns
+    added to existing tables since they were created are added with ALTER TABLE.
+    """
+    db.create_all()
+
+    order_columns = [column['name'] for column in inspect(db.engine).get_columns('order')]
+    if 'date_ordered' not in order_columns:
+        # Existing orders keep a NULL date, the archiver leaves orders of unknown age alone
+        with db.engine.begin() as connection:
+            connection.execute(text('ALTER TABLE "order" ADD COLUMN date_ordered DATETIME'))
+
+
+@db_cli.command('upgrade')
+def upgrade_command():
+    """Create missing tables and columns in the database."""
+    upgrade()
+    print('Database upgraded')
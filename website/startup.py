@@ -0,0 +1,60 @@
+import os
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache
+
+# CLI group for ahead-of-time template work, e.g. `flask --app main templates compile` in the Dockerfile
+templates_cli = AppGroup('templates', help='Precompile templates into the bytecode cache.')
+
+
+def configure_template_cache(app):
+    """
+    Points Jinja at a persistent bytecode cache so new workers load compiled templates from disk
+    instead of compiling them again. Must run before app.jinja_env is first used.
+    """
+    cache_dir = app.config.get('JINJA_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(cache_dir))
+
+
+def compile_templates(app):
+    """
+    Loads every template once, filling the bytecode cache. Returns the number of templates loaded.
+    """
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_up(app):
+    """
+    Compiles all templates and renders the hot pages listed in WARM_UP_PATHS before the worker
+    accepts traffic, so the first real requests don't pay for it.
+    """
+    compile_templates(app)
+
+    client = app.test_client()
+    for path in app.config.get('WARM_UP_PATHS', ['/']):
+        try:
+            response = client.get(path)
+            if response.status_code >= 400:
+                print('Warm-up request failed', path, response.status)
+        except Exception as e:
+            print('Warm-up request failed', path, e)
+
+
+def running_cli():
+    """
+    True while a `flask` CLI command is loading the app, e.g. `flask db upgrade` before the tables
+    exist, where warming up would only fail.
+    """
+    return click.get_current_context(silent=True) is not None
+
+
+@templates_cli.command('compile')
+def compile_command():
+    """Compile all templates into the bytecode cache."""
+    count = compile_templates(current_app)
+    print(f'{count} template(s) compiled')
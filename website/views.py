@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, flash, redirect, request, jsonify
+from flask import Blueprint, render_template, flash, redirect, request, jsonify, current_app, g
 from .models import Product, Cart, Order
 from flask_login import login_required, current_user
 from . import db
-from intasend import APIService
+from .inventory import record_movement, SALE
+from .archive import customer_orders
+from .flash_sale import flash_sale, flash_gate, flash_sale_admission, admit_buyer
 
 # Define a blueprint for views
 views = Blueprint('views', __name__)
@@ -25,13 +27,32 @@ def home():
 
 
 @views.route('/add-to-cart/<int:item_id>')
+@flash_sale_admission
 @login_required
 def add_to_cart(item_id):
     """
     Adds a product to the user's cart. If the product already exists, it increments the quantity.
+    Flash sale products go through the waiting room and stock gate before touching the database.
     """
+    sale = flash_sale()
+    gated = sale is not None and sale.gate.tracks(item_id)
+    if gated and g.get('flash_sale_admitted') != item_id:
+        # Logged in from the remember me cookie, so the admission check above had no user id
+        response = admit_buyer(sale, item_id, current_user.id)
+        if response is not None:
+            return response
+
     item_to_add = Product.query.get(item_id)
     item_exists = Cart.query.filter_by(product_link=item_id, customer_link=current_user.id).first()
+
+    # Reserve the units in the gate, the reservation expires if no order is placed
+    quantity = item_exists.quantity + 1 if item_exists else 1
+    if gated:
+        if not sale.gate.hold(item_id, current_user.id, quantity):
+            flash('Sorry, this item is sold out')
+            return redirect(request.referrer)
+        sale.room(item_id).leave(current_user.id)  # Admission used, the next add queues again
+
     if item_exists:         # Increment the quantity if the item is already in the cart
         try:
             item_exists.quantity = item_exists.quantity + 1
@@ -40,6 +61,8 @@ def add_to_cart(item_id):
             return redirect(request.referrer)
         except Exception as e:
             print('Quantity not Updated', e)
+            if gated:
+                sale.gate.release(item_id, current_user.id, 1)
             flash(f'Quantity of { item_exists.product.product_name } not updated')
             return redirect(request.referrer)
 
@@ -55,6 +78,8 @@ def add_to_cart(item_id):
         flash(f'{new_cart_item.product.product_name} added to cart')
     except Exception as e:
         print('Item not added to cart', e)
+        if gated:
+            sale.gate.release(item_id, current_user.id)
         flash(f'{new_cart_item.product.product_name} has not been added to cart')
 
     return redirect(request.referrer)
@@ -83,8 +108,14 @@ def plus_cart():
     if request.method == 'GET':
         cart_id = request.args.get('cart_id')
         cart_item = Cart.query.get(cart_id)
-        cart_item.quantity = cart_item.quantity + 1
-        db.session.commit()
+
+        # Flash sale items only go up while the gate still has stock
+        gate = flash_gate()
+        sold_out = gate is not None and gate.tracks(cart_item.product_link) and \
+            not gate.hold(cart_item.product_link, current_user.id, cart_item.quantity + 1)
+        if not sold_out:
+            cart_item.quantity = cart_item.quantity + 1
+            db.session.commit()
 
         cart = Cart.query.filter_by(customer_link=current_user.id).all()
 
@@ -114,6 +145,10 @@ def minus_cart():
         cart_item.quantity = cart_item.quantity - 1
         db.session.commit()
 
+        gate = flash_gate()
+        if gate is not None:
+            gate.release(cart_item.product_link, current_user.id, 1)
+
         cart = Cart.query.filter_by(customer_link=current_user.id).all()
 
         amount = 0
@@ -142,6 +177,10 @@ def remove_cart():
         db.session.delete(cart_item)
         db.session.commit()
 
+        gate = flash_gate()
+        if gate is not None:
+            gate.release(cart_item.product_link, current_user.id)
+
         cart = Cart.query.filter_by(customer_link=current_user.id).all()
 
         amount = 0
@@ -161,7 +200,7 @@ def remove_cart():
 @views.route('/place-order')
 @login_required
 def place_order():
-     """
+    """
     Places an order for all items in the cart using IntaSend payment API and update stock and clear the cart after successful payment.
     """
     customer_cart = Cart.query.filter_by(customer_link=current_user.id)
@@ -171,6 +210,16 @@ def place_order():
             for item in customer_cart:
                 total += item.product.current_price * item.quantity
 
+            # Flash sale items must still be available before the buyer is asked to pay
+            gate = flash_gate()
+            if gate is not None:
+                for item in customer_cart:
+                    if gate.tracks(item.product_link) and \
+                            not gate.hold(item.product_link, current_user.id, item.quantity):
+                        flash(f'Sorry, {item.product.product_name} is sold out')
+                        return redirect('/cart')
+
+            from intasend import APIService  # Imported lazily, it pulls in requests and slows worker start-up
             service = APIService(token=API_TOKEN, publishable_key=API_PUBLISHABLE_KEY, test=True)
             create_order_response = service.collect.mpesa_stk_push(phone_number='YOUR_NUMBER ', email=current_user.email,
                                                                    amount=total + 200, narrative='Purchase of goods')
@@ -188,16 +237,18 @@ def place_order():
 
                 db.session.add(new_order)
 
-                # Update product
-                product = Product.query.get(item.product_link)
-                product.in_stock -= item.quantity
-
+                # Update product stock through the inventory ledger
+                record_movement(item.product_link, -item.quantity, SALE, new_order)
 
                 # Remove item from the cart
+                product_id = item.product_link
                 db.session.delete(item)
 
                 db.session.commit()
 
+                if gate is not None:
+                    gate.consume(product_id, current_user.id)  # Reserved units are now sold
+
             flash('Order Placed Successfully')
 
             return redirect('/orders')
@@ -214,10 +265,12 @@ def place_order():
 @login_required
 def order():
     """
-    Displays all the orders placed by the current user.
+    Displays the orders placed by the current user a page at a time, newest first. Older pages
+    continue into archived orders once the ones in the database run out.
     """
-    orders = Order.query.filter_by(customer_link=current_user.id).all()
-    return render_template('orders.html', orders=orders)
+    page = max(request.args.get('page', 1, type=int), 1)
+    orders, has_next = customer_orders(current_user.id, page, current_app.config['ORDERS_PER_PAGE'])
+    return render_template('orders.html', orders=orders, page=page, has_next=has_next)
 
 
 @views.route('/search', methods=['GET', 'POST'])